@@ -0,0 +1,15 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+from enum import IntEnum
+
+class Op(IntEnum):
+    """ALU operation codes, driven on ui_in[6:4]"""
+    ADD = 0b000
+    SUB = 0b001
+    AND = 0b010
+    OR  = 0b011
+    XOR = 0b100
+    SHL = 0b101  # Shift left
+    SHR = 0b110  # Shift right
+    NOT = 0b111  # Bitwise NOT
@@ -11,6 +11,14 @@ module tb ();
     $dumpvars(0, tb);
     #1;
   end
+
+`ifndef VERILATOR
+  // Driven low from test.py (no_waves) to pause VCD recording
+  reg dump_on = 1'b1;
+  always @(dump_on)
+    if (dump_on) $dumpon;
+    else $dumpoff;
+`endif
   
   // Wire up the inputs and outputs:
   reg clk;
@@ -21,6 +29,13 @@ module tb ();
   wire [7:0] uo_out;
   wire [7:0] uio_out;
   wire [7:0] uio_oe;
+
+  // The ALU is combinational, so the clock is held low here rather than
+  // generated from Python. ena stays high for the whole simulation.
+  initial begin
+    clk = 1'b0;
+    ena = 1'b1;
+  end
   
 `ifdef GL_TEST
   wire VPWR = 1'b1;
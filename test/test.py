@@ -1,282 +1,222 @@
 # SPDX-FileCopyrightText: © 2024 Tiny Tapeout
 # SPDX-License-Identifier: Apache-2.0
 
+import functools
+import logging
+import os
+
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles, Timer
+from cocotb.triggers import Timer
+
+from ops import Op
+
+# Enables the diagnostic test_debug_alu_behavior
+DEBUG = bool(os.environ.get("COCOTB_DEBUG"))
+
+# Keep recording tb.vcd during the functional tests (see no_waves). This is
+# separate from WAVES=1, which makes cocotb add its own FST dump.
+TB_VCD = os.environ.get("TB_VCD") == "1"
+
+GATES = os.environ.get("GATES") == "yes"
+
+# Wait for uo_out to settle after driving the inputs. RTL settles within one
+# simulator step; the gate level netlist has a unit delay per cell.
+SETTLE = Timer(100, units="ns") if GATES else Timer(1, units="step")
+
+def pack(mode, op, b):
+    """Encode mode, opcode and the 4-bit B operand as a ui_in value"""
+    return (mode << 7) | (op << 4) | (b & 0xF)
+
+# Unmasked result of each opcode, as computed by alu_8bit and alu_4bit
+_OPS = {
+    Op.ADD: lambda a, b: a + b,
+    Op.SUB: lambda a, b: a - b,
+    Op.AND: lambda a, b: a & b,
+    Op.OR:  lambda a, b: a | b,
+    Op.XOR: lambda a, b: a ^ b,
+    Op.SHL: lambda a, b: a << 1,
+    Op.SHR: lambda a, b: a >> 1,
+    Op.NOT: lambda a, b: ~a,
+}
+
+def ref_alu(mode, op, a, b):
+    """Reference model: expected uo_out for mode, opcode, A (uio_in) and the 4-bit B"""
+    fn = _OPS[op]
+    if mode == 0:
+        # operand_b replicates the 4-bit B into both nibbles
+        return fn(a, b * 0x11) & 0xFF
+    return (fn(a >> 4, b) & 0xF) << 4 | (fn(a & 0xF, b) & 0xF)
+
+class SignalProxy:
+    """Int-only access to a signal for hot loops.
+
+    Writes are deposited immediately through the GPI handle rather than
+    queued for the ReadWrite phase, and reads skip BinaryValue construction.
+    get_int reads X/Z bits as plain 0/1, so callers check _check_resolved.
+    Relies on the cocotb 1.9 handle internals pinned in requirements.txt.
+    """
+
+    GPI_DEPOSIT = 0
+
+    def __init__(self, sig):
+        self._handle = sig._handle
+
+    def set_int(self, value):
+        self._handle.set_signal_val_int(self.GPI_DEPOSIT, value)
+
+    def get_int(self):
+        return self._handle.get_signal_val_long()
+
+# One SignalProxy per signal, shared by every test in the simulation
+_proxies = {}
+
+def _proxy(sig):
+    """Return the shared SignalProxy for sig"""
+    proxy = _proxies.get(sig)
+    if proxy is None:
+        proxy = _proxies[sig] = SignalProxy(sig)
+    return proxy
 
-# ALU Operation codes
-ADD = 0b000
-SUB = 0b001
-AND = 0b010
-OR  = 0b011
-XOR = 0b100
-SHL = 0b101
-SHR = 0b110
-NOT = 0b111
+def _check_resolved(sig, ui_in, uio_in):
+    """Fail if sig has X/Z bits, which SignalProxy.get_int cannot see"""
+    value = sig.value
+    if not value.is_resolvable:
+        raise AssertionError(f"{sig._name} is {value.binstr} at ui_in=0x{ui_in:02X} uio_in=0x{uio_in:02X}")
+
+def no_waves(test):
+    """Pause tb.vcd recording while test runs, unless TB_VCD=1 is set"""
+    @functools.wraps(test)
+    async def wrapper(dut):
+        if TB_VCD or not hasattr(dut, "dump_on"):
+            return await test(dut)
+        dut.dump_on.setimmediatevalue(0)
+        try:
+            return await test(dut)
+        finally:
+            dut.dump_on.setimmediatevalue(1)
+    return wrapper
 
 @cocotb.test()
+async def test_reset(dut):
+    """Pulse reset once; later tests inherit this state (tb.v drives ena)"""
+    dut._log.info("Reset")
+    # Immediate writes take effect without waiting for a ReadWrite callback
+    dut.ui_in.setimmediatevalue(0)
+    dut.uio_in.setimmediatevalue(0)
+    dut.rst_n.setimmediatevalue(0)
+    await Timer(200, units="ns")  # 10 cycles of the 20 ns CLOCK_PERIOD in config.json
+    dut.rst_n.setimmediatevalue(1)
+
+# Diagnostic only: logs raw DUT output without checking it
+@cocotb.test(skip=not DEBUG)
 async def test_debug_alu_behavior(dut):
     """Debug test to understand actual ALU behavior"""
     dut._log.info("Start debug test - examining ALU behavior")
     
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
     # Test what the ALU actually returns
-    dut.ui_in.value = 0b00001010  # Mode=0, OP=ADD, B=10  
-    dut.uio_in.value = 0b00001111  # A=15
-    await Timer(1, units="ns")
+    dut.ui_in.setimmediatevalue(0b00001010)  # Mode=0, OP=ADD, B=10
+    dut.uio_in.setimmediatevalue(0b00001111)  # A=15
+    await SETTLE
     
     # Convert the BinaryValue to integer properly
     result_raw = dut.uo_out.value
     result_int = int(result_raw)
     
-    dut._log.info(f"Debug: A=15, B=10, ADD operation")
-    dut._log.info(f"Raw output: {result_raw}")
-    dut._log.info(f"Integer output: {result_int}")
-    dut._log.info(f"Expected: 25")
-    dut._log.info(f"Binary representation: {bin(result_int)}")
-    dut._log.info(f"Hex representation: {hex(result_int)}")
+    # %-style arguments are only formatted if the record is emitted
+    dut._log.info("Debug: A=15, B=10, ADD operation")
+    dut._log.info("Raw output: %s", result_raw)
+    dut._log.info("Integer output: %d", result_int)
+    dut._log.info("Expected: %d", ref_alu(0, Op.ADD, 15, 10))
+    dut._log.info("Binary representation: %s", bin(result_int))
+    dut._log.info("Hex representation: %#x", result_int)
 
-@cocotb.test()
-async def test_8bit_mode_basic(dut):
-    """Test basic 8-bit ALU operations"""
-    dut._log.info("Start 8-bit mode basic test")
-    
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut._log.info("Reset")
-    dut.ena.value = 1
-    dut.ui_in.value = 0
-    dut.uio_in.value = 0
-    dut.rst_n.value = 0
-    await ClockCycles(dut.clk, 10)
-    dut.rst_n.value = 1
-    
-    # Test 8-bit ADD: 15 + 10 = 25
-    dut._log.info("Testing 8-bit ADD: 15 + 10")
-    mode_select = 0  # 8-bit mode
-    opcode = ADD
-    operand_b = 10
-    operand_a = 15
-    
-    dut.ui_in.value = (mode_select << 7) | (opcode << 4) | operand_b
-    dut.uio_in.value = operand_a
-    await Timer(1, units="ns")  # Combinational delay
-    
-    # Convert BinaryValue to int before comparison
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit ADD result: {result}")
-    
-    # For now, just check that result is in valid range
-    # The actual value seems to be incorrect based on the Verilog implementation
-    assert 0 <= result <= 255, f"ADD result out of range: {result}"
-    
-    # Test 8-bit SUB: 20 - 5 = 15
-    dut._log.info("Testing 8-bit SUB: 20 - 5")
-    dut.ui_in.value = (0 << 7) | (SUB << 4) | 5
-    dut.uio_in.value = 20
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit SUB result: {result}")
-    assert 0 <= result <= 255, f"SUB result out of range: {result}"
+# Expected uo_out for every input combination, indexed by (ui_in << 8) | uio_in.
+# Built once at import time so the test loops only do a lookup between awaits.
+EXPECTED = bytes(ref_alu(ui_in >> 7, (ui_in >> 4) & 0b111, uio_in, ui_in & 0xF)
+                 for ui_in in range(256) for uio_in in range(256))
 
-@cocotb.test()
-async def test_8bit_mode_bitwise(dut):
-    """Test 8-bit bitwise operations"""
-    dut._log.info("Start 8-bit bitwise operations test")
-    
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
-    # Test 8-bit AND: 0xAA & 0x0F
-    dut._log.info("Testing 8-bit AND: 0xAA & 0x0F")
-    dut.ui_in.value = (0 << 7) | (AND << 4) | 0x0F
-    dut.uio_in.value = 0xAA
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit AND result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"AND result out of range: {result}"
-    
-    # Test 8-bit OR: 0x33 | 0x0C
-    dut._log.info("Testing 8-bit OR: 0x33 | 0x0C")
-    dut.ui_in.value = (0 << 7) | (OR << 4) | 0x0C
-    dut.uio_in.value = 0x33
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit OR result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"OR result out of range: {result}"
-    
-    # Test 8-bit XOR: 0xF0 ^ 0x0A
-    dut._log.info("Testing 8-bit XOR: 0xF0 ^ 0x0A")
-    dut.ui_in.value = (0 << 7) | (XOR << 4) | 0x0A
-    dut.uio_in.value = 0xF0
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit XOR result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"XOR result out of range: {result}"
+# Directed stimulus for test_alu_all: (mode, opcode, a, b)
+CASES = [
+    (0, Op.ADD, 15,   10),
+    (0, Op.SUB, 20,   5),
+    (0, Op.AND, 0xAA, 0x0F),
+    (0, Op.OR,  0x33, 0x0C),
+    (0, Op.XOR, 0xF0, 0x0A),
+    (0, Op.SHL, 0x55, 0),
+    (0, Op.SHR, 0xAA, 0),
+    (0, Op.NOT, 0xF0, 0),
+    (1, Op.ADD, 0x72, 1),
+]
 
-@cocotb.test()
-async def test_8bit_mode_shifts(dut):
-    """Test 8-bit shift operations"""
-    dut._log.info("Start 8-bit shift operations test")
-    
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
-    # Test 8-bit SHL: 0x55 << 1
-    dut._log.info("Testing 8-bit SHL: 0x55 << 1")
-    dut.ui_in.value = (0 << 7) | (SHL << 4) | 0
-    dut.uio_in.value = 0x55
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit SHL result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"SHL result out of range: {result}"
-    
-    # Test 8-bit SHR: 0xAA >> 1
-    dut._log.info("Testing 8-bit SHR: 0xAA >> 1")
-    dut.ui_in.value = (0 << 7) | (SHR << 4) | 0
-    dut.uio_in.value = 0xAA
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit SHR result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"SHR result out of range: {result}"
-    
-    # Test 8-bit NOT: ~0xF0
-    dut._log.info("Testing 8-bit NOT: ~0xF0")
-    dut.ui_in.value = (0 << 7) | (NOT << 4) | 0
-    dut.uio_in.value = 0xF0
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"8-bit NOT result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"NOT result out of range: {result}"
+# (ui_in, uio_in) for each case and the matching slice of EXPECTED, encoded
+# once at import time
+TEST_VECS = [(pack(m, op, b), a) for m, op, a, b in CASES]
+TEST_KEYS = [ui_in << 8 | uio_in for ui_in, uio_in in TEST_VECS]
+TEST_EXPECTED = bytes(EXPECTED[key] for key in TEST_KEYS)
+# uio_out echoes {mode, opcode, 4'b0000} as a status byte
+TEST_STATUS = bytes(ui_in & 0xF0 for ui_in, _ in TEST_VECS)
 
-@cocotb.test()
-async def test_dual_4bit_mode_basic(dut):
-    """Test dual 4-bit mode operations"""
-    dut._log.info("Start dual 4-bit mode test")
-    
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
-    # Test dual 4-bit ADD
-    dut._log.info("Testing dual 4-bit ADD")
-    mode_select = 1  # dual 4-bit mode
-    opcode = ADD
-    operand_b = 0x01  # B=1
-    operand_a = 0x72  # A_high=7, A_low=2
-    
-    dut.ui_in.value = (mode_select << 7) | (opcode << 4) | (operand_b & 0x0F)
-    dut.uio_in.value = operand_a
-    await Timer(1, units="ns")
-    
-    result = int(dut.uo_out.value)
-    dut._log.info(f"Dual 4-bit ADD result: {result} (0x{result:02X})")
-    assert 0 <= result <= 255, f"Dual ADD result out of range: {result}"
+def _check_results(dut, name, keys, observed, expected):
+    """Compare results for output name in one pass; on failure log the first mismatching inputs"""
+    if observed == expected:
+        dut._log.info("%s: %d vectors OK", name, len(expected))
+        return
+    mismatches = [i for i in range(len(expected)) if observed[i] != expected[i]]
+    for i in mismatches[:10]:
+        key = keys[i]
+        dut._log.error("%s: ui_in=0x%02X uio_in=0x%02X: expected 0x%02X, got 0x%02X",
+                       name, key >> 8, key & 0xFF, expected[i], observed[i])
+    raise AssertionError(f"{name}: {len(mismatches)} of {len(expected)} vectors mismatched")
 
 @cocotb.test()
-async def test_all_operations_comprehensive(dut):
-    """Comprehensive test of all ALU operations"""
-    dut._log.info("Start comprehensive ALU test")
-    
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    # Reset
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
-    # Test all operations systematically
-    operations = [
-        (ADD, "ADD"),
-        (SUB, "SUB"), 
-        (AND, "AND"),
-        (OR, "OR"),
-        (XOR, "XOR"),
-        (SHL, "SHL"),
-        (SHR, "SHR"),
-        (NOT, "NOT")
-    ]
-    
-    # Test in both modes
-    for mode in [0, 1]:
-        mode_name = "8-bit" if mode == 0 else "dual-4bit"
-        dut._log.info(f"Testing {mode_name} mode:")
-        
-        for op_code, op_name in operations:
-            # Use consistent test values
-            operand_a = 0x55  # 01010101
-            operand_b = 0x03
-            
-            dut.ui_in.value = (mode << 7) | (op_code << 4) | (operand_b & 0x0F)
-            dut.uio_in.value = operand_a
-            await Timer(1, units="ns")
-            
-            result = int(dut.uo_out.value)
-            dut._log.info(f"  {op_name}: A=0x{operand_a:02X}, B=0x{operand_b:02X} -> {result} (0x{result:02X})")
-            
-            # Basic validation
-            assert 0 <= result <= 255, f"{mode_name} {op_name} result out of range: {result}"
-    
-    dut._log.info("Comprehensive test completed successfully!")
+@no_waves
+async def test_alu_all(dut):
+    """Test 8-bit and dual 4-bit operations against expected results"""
+    dut._log.info("Start directed ALU test")
+    
+    ui, uio, uo = _proxy(dut.ui_in), _proxy(dut.uio_in), _proxy(dut.uo_out)
+    status = _proxy(dut.uio_out)
+    
+    # The loop only drives and records; checking happens once at the end
+    observed = bytearray()
+    observed_status = bytearray()
+    for ui_in, uio_in in TEST_VECS:
+        ui.set_int(ui_in)
+        uio.set_int(uio_in)
+        await SETTLE
+        _check_resolved(dut.uo_out, ui_in, uio_in)
+        _check_resolved(dut.uio_out, ui_in, uio_in)
+        observed.append(uo.get_int())
+        observed_status.append(status.get_int())
+    
+    if dut._log.isEnabledFor(logging.DEBUG):
+        for (ui_in, uio_in), result in zip(TEST_VECS, observed):
+            dut._log.debug(f"ui_in=0x{ui_in:02X} uio_in=0x{uio_in:02X} -> 0x{result:02X}")
+    _check_results(dut, "uo_out", TEST_KEYS, observed, TEST_EXPECTED)
+    _check_results(dut, "uio_out", TEST_KEYS, observed_status, TEST_STATUS)
 
 @cocotb.test()
-async def test_simple_validation(dut):
-    """Simple validation without exact value checking"""
-    dut._log.info("Start simple validation test")
-    
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
-    
-    dut.ena.value = 1
-    dut.rst_n.value = 1
-    
-    # Just verify the ALU responds to inputs
-    test_cases = [
-        (0b00000001, 0b00000010, "8-bit ADD: 2+1"),
-        (0b00010010, 0b00000101, "8-bit SUB: 5-2"),
-        (0b10000001, 0b00100011, "Dual-4bit ADD"),
-    ]
-    
-    for ui_val, uio_val, desc in test_cases:
-        dut.ui_in.value = ui_val
-        dut.uio_in.value = uio_val
-        await Timer(1, units="ns")
-        
-        result = int(dut.uo_out.value)
-        dut._log.info(f"{desc} -> {result}")
-        assert 0 <= result <= 255, f"Invalid result for {desc}: {result}"
-    
-    dut._log.info("Simple validation passed!")
+@no_waves
+async def test_alu_exhaustive(dut):
+    """Sweep every mode, opcode and operand combination against ref_alu"""
+    dut._log.info("Start exhaustive ALU test")
+    
+    ui, uio, uo = _proxy(dut.ui_in), _proxy(dut.uio_in), _proxy(dut.uo_out)
+    
+    # 1 mode bit, 3 opcode bits, 4 B bits and 8 A bits: 65536 vectors.
+    # ui_in only changes every 256 vectors, so it is written once per row.
+    # Vectors run in EXPECTED's index order, so results are simply appended.
+    # X/Z is checked on every gate level vector, and once per row for RTL.
+    observed = bytearray()
+    record = observed.append
+    for ui_in in range(256):
+        ui.set_int(ui_in)
+        for uio_in in range(256):
+            uio.set_int(uio_in)
+            await SETTLE
+            record(uo.get_int())
+            if GATES:
+                _check_resolved(dut.uo_out, ui_in, uio_in)
+        _check_resolved(dut.uo_out, ui_in, uio_in)
+    
+    _check_results(dut, "uo_out", range(len(EXPECTED)), observed, EXPECTED)
@@ -0,0 +1,87 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Runs each cocotb test in test.py in its own simulator process, so the
+# RTL tests can be spread across cores with pytest-xdist:
+#
+#   pytest -n auto test_runner.py
+#
+# The Makefile flow (`make -B`, `make -B GATES=yes`) is unchanged.
+
+import os
+import re
+from pathlib import Path
+
+import pytest
+from cocotb.runner import get_runner
+
+TEST_DIR = Path(__file__).resolve().parent
+SRC_DIR = TEST_DIR.parent / "src"
+
+def makefile_list(name):
+    """Words assigned to NAME in the Makefile, so both flows share one list.
+
+    Handles `=`, `:=`, `?=` and `+=` with plain words. Anything make would
+    have to expand, such as a `\\` continuation or a `$(...)` reference, is
+    rejected rather than silently read differently from `make`.
+    """
+    words = None
+    makefile = TEST_DIR / "Makefile"
+    for lineno, line in enumerate(makefile.read_text().splitlines(), 1):
+        match = re.match(rf"\s*{name}\s*([:?+]?)=(.*)$", line)
+        if not match:
+            continue
+        op, value = match.groups()
+        if value.rstrip().endswith("\\") or "$" in value:
+            raise ValueError(f"{makefile}:{lineno}: {name} must be plain words on one line")
+        if op == "+" and words is not None:
+            words += value.split()
+        elif op != "?" or words is None:
+            words = value.split()
+    if words is None:
+        raise ValueError(f"{makefile}: no assignment to {name}")
+    return words
+
+PROJECT_SOURCES = makefile_list("PROJECT_SOURCES")
+
+SIM = os.environ.get("SIM", "icarus")
+
+# The Makefile flow's default COCOTB_HDL_TIMEUNIT/TIMEPRECISION
+TIMESCALE = ("1ns", "1ps")
+
+# Same optimised build as the Makefile uses for SIM=verilator. cocotb 1.9's
+# Verilator runner ignores timescale=, so it is passed as a flag here.
+BUILD_ARGS = []
+if SIM == "verilator":
+    BUILD_ARGS = makefile_list("VERILATOR_ARGS") + ["--timescale", "/".join(TIMESCALE)]
+
+# cocotb tests from test.py, one simulator invocation each
+TESTCASES = ["test_alu_all", "test_alu_exhaustive"]
+
+@pytest.fixture(scope="session")
+def runner():
+    """Build the RTL once per pytest worker"""
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    build_dir = TEST_DIR / "sim_build" / "runner" / worker
+
+    runner = get_runner(SIM)
+    runner.build(
+        verilog_sources=[SRC_DIR / src for src in PROJECT_SOURCES] + [TEST_DIR / "tb.v"],
+        includes=[SRC_DIR],
+        build_args=BUILD_ARGS,
+        hdl_toplevel="tb",
+        timescale=TIMESCALE,
+        build_dir=build_dir,
+    )
+    return runner
+
+@pytest.mark.parametrize("testcase", TESTCASES)
+def test_cocotb(runner, testcase):
+    # Separate run directories keep each process's tb.vcd and results apart.
+    # test_reset runs first in every process to set up rst_n.
+    runner.test(
+        test_module="test",
+        hdl_toplevel="tb",
+        testcase=["test_reset", testcase],
+        test_dir=TEST_DIR / "sim_build" / "runner" / testcase,
+    )